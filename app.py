@@ -1,16 +1,18 @@
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
+from streamlit_autorefresh import st_autorefresh
 from datetime import datetime, timedelta
-import time
 import random
 import sqlite3
 import os
 from io import BytesIO
+from collections import Counter
 
 # Import utility modules
 from utils.data_parser import LeadParser
 from utils.dialer_simulator import DialerSimulator
+from utils.store import CampaignStore
 
 # Page configuration
 st.set_page_config(
@@ -23,8 +25,15 @@ st.set_page_config(
 # Initialize session state
 if 'contacts' not in st.session_state:
     st.session_state.contacts = pd.DataFrame()
+if 'store' not in st.session_state:
+    try:
+        st.session_state.store = CampaignStore()
+    except sqlite3.Error as e:
+        # Persistence is optional; dialing and stats all run from session state
+        st.session_state.store = None
+        st.warning(f"⚠️ Campaign database unavailable, contacts and calls won't be saved: {e}")
 if 'dialer' not in st.session_state:
-    st.session_state.dialer = DialerSimulator()
+    st.session_state.dialer = DialerSimulator(store=st.session_state.store)
 if 'call_log' not in st.session_state:
     st.session_state.call_log = []
 if 'current_index' not in st.session_state:
@@ -42,8 +51,39 @@ if 'agents' not in st.session_state:
 if 'dialing_mode' not in st.session_state:
     st.session_state.dialing_mode = 'single'  # 'single' or 'power'
 
-# Custom CSS for better UI
-st.markdown("""
+# Helper functions
+def calls_per_hour(call_history):
+    """Count calls per hour of day, recomputed only when new calls are logged"""
+    cached = st.session_state.get('calls_per_hour')
+    if cached is None or cached[0] != len(call_history):
+        start_times = pd.to_datetime(pd.Series([call.start_time for call in call_history]))
+        counts = start_times.dt.hour.value_counts().sort_index()
+        counts.index = [f"{hour:02d}:00" for hour in counts.index]
+        st.session_state.calls_per_hour = (len(call_history), counts)
+    return st.session_state.calls_per_hour[1]
+
+def metric_card(label, value):
+    """Render a dashboard metric inside the gradient metric card"""
+    st.markdown(f"""
+    <div class="metric-card">
+        <div style="font-size: 0.9rem;">{label}</div>
+        <div style="font-size: 2rem; font-weight: bold;">{value}</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+def filter_contacts(contacts, search_term):
+    """Filter contacts by name or phone, reusing the last result for the same search"""
+    cached = st.session_state.get('contact_filter')
+    if cached is None or cached[0] is not contacts or cached[1] != search_term:
+        mask = contacts['_search'].str.contains(search_term.lower(), regex=False, na=False)
+        st.session_state.contact_filter = (contacts, search_term, contacts[mask])
+    return st.session_state.contact_filter[2]
+
+# Custom CSS for better UI (built once per server process, not per rerun)
+@st.cache_resource
+def load_css():
+    """Return the app's custom stylesheet"""
+    return """
 <style>
     .main-header {
         font-size: 2.5rem;
@@ -107,7 +147,9 @@ st.markdown("""
         100% { opacity: 1; }
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(load_css(), unsafe_allow_html=True)
 
 # Main Header
 st.markdown('<h1 class="main-header">📞 Auto Dialer Pro</h1>', unsafe_allow_html=True)
@@ -150,46 +192,31 @@ if page == "🏠 Dashboard":
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-        st.metric("Total Contacts", len(st.session_state.contacts))
-        st.markdown('</div>', unsafe_allow_html=True)
+        metric_card("Total Contacts", len(st.session_state.contacts))
+    
+    call_stats = st.session_state.dialer.get_call_stats()
     
     with col2:
-        st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-        calls_today = len(st.session_state.dialer.call_history)
-        st.metric("Calls Today", calls_today)
-        st.markdown('</div>', unsafe_allow_html=True)
+        metric_card("Calls Today", call_stats['total_calls'])
     
     with col3:
-        st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-        if calls_today > 0:
-            answered = len([c for c in st.session_state.dialer.call_history if c['answered']])
-            success_rate = (answered / calls_today) * 100
-        else:
-            success_rate = 0
-        st.metric("Answer Rate", f"{success_rate:.1f}%")
-        st.markdown('</div>', unsafe_allow_html=True)
+        metric_card("Answer Rate", f"{call_stats['success_rate']:.1f}%")
     
     with col4:
-        st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-        st.metric("Active Campaign", "Running" if st.session_state.campaign_active else "Paused")
-        st.markdown('</div>', unsafe_allow_html=True)
+        metric_card("Active Campaign", "Running" if st.session_state.campaign_active else "Paused")
     
     # Call Statistics Chart
     st.markdown('<h3 class="sub-header">📈 Call Statistics</h3>', unsafe_allow_html=True)
     
     if st.session_state.dialer.call_history:
         # Create time-series data
-        calls_by_hour = {}
-        for call in st.session_state.dialer.call_history:
-            hour = call['start_time'].strftime("%H:00")
-            calls_by_hour[hour] = calls_by_hour.get(hour, 0) + 1
+        calls_by_hour = calls_per_hour(st.session_state.dialer.call_history)
         
         # Create Plotly chart
         fig = go.Figure()
         fig.add_trace(go.Bar(
-            x=list(calls_by_hour.keys()),
-            y=list(calls_by_hour.values()),
+            x=calls_by_hour.index.tolist(),
+            y=calls_by_hour.tolist(),
             name="Calls per Hour",
             marker_color='#3B82F6'
         ))
@@ -212,17 +239,17 @@ if page == "🏠 Dashboard":
     if st.session_state.dialer.call_history:
         recent_calls = st.session_state.dialer.call_history[-5:]  # Last 5 calls
         for call in reversed(recent_calls):
-            mode_icon = "⚡" if call.get('mode') == 'power' else "📞"
-            status = "✅ Answered" if call['answered'] else "❌ Not Answered"
-            with st.expander(f"{mode_icon} {call['contact'].get('name', 'Unknown')} - {call['contact']['phone']} - {status}"):
+            mode_icon = "⚡" if call.mode == 'power' else "📞"
+            status = "✅ Answered" if call.answered else "❌ Not Answered"
+            with st.expander(f"{mode_icon} {call.contact.get('name', 'Unknown')} - {call.contact['phone']} - {status}"):
                 col1, col2 = st.columns(2)
                 with col1:
-                    st.write(f"**Time:** {call['start_time'].strftime('%I:%M %p')}")
-                    st.write(f"**Duration:** {call.get('duration', 0):.1f}s")
-                    st.write(f"**Mode:** {call.get('mode', 'single').title()}")
+                    st.write(f"**Time:** {call.start_time.strftime('%I:%M %p')}")
+                    st.write(f"**Duration:** {call.duration:.1f}s")
+                    st.write(f"**Mode:** {call.mode.title()}")
                 with col2:
-                    st.write(f"**Attempts:** {len(call['attempts'])}")
-                    st.write(f"**State:** {call['contact'].get('state', 'N/A')}")
+                    st.write(f"**Attempts:** {len(call.attempts)}")
+                    st.write(f"**State:** {call.contact.get('state', 'N/A')}")
     else:
         st.info("No recent calls. Start your campaign!")
 
@@ -259,10 +286,24 @@ elif page == "📋 Contact Manager":
             
             # Save to session state
             if st.button("💾 Save to Campaign", type="primary"):
+                # Arrow-backed strings and categorical states keep the frame compact
+                # and cheap to hand to st.dataframe on every rerun
+                contacts_df = contacts_df.astype({'name': 'string[pyarrow]', 'phone': 'string[pyarrow]',
+                                                  'state': 'category'})
+                # Lowercased name/phone built once so searching is a plain substring scan
+                contacts_df['_search'] = (contacts_df['name'].fillna('') + '\n' +
+                                          contacts_df['phone'].fillna('')).str.lower()
                 st.session_state.contacts = contacts_df
                 st.session_state.current_index = 0
-                st.success(f"✅ {len(contacts_df)} contacts loaded for dialing!")
-                st.rerun()
+                try:
+                    if st.session_state.store:
+                        st.session_state.store.save_contacts(contacts_df)
+                except sqlite3.Error as e:
+                    # Dialing works from the in-memory list, so only persistence is lost
+                    st.warning(f"⚠️ Contacts loaded but could not be saved: {e}")
+                else:
+                    st.success(f"✅ {len(contacts_df)} contacts loaded for dialing!")
+                    st.rerun()
         else:
             st.error("Failed to parse the file. Please check the format.")
     
@@ -275,16 +316,25 @@ elif page == "📋 Contact Manager":
         
         filtered_contacts = st.session_state.contacts
         if search_term:
-            mask = (filtered_contacts['name'].str.contains(search_term, case=False)) | \
-                   (filtered_contacts['phone'].str.contains(search_term, case=False))
-            filtered_contacts = filtered_contacts[mask]
+            filtered_contacts = filter_contacts(filtered_contacts, search_term)
+        
+        # Show filtered contacts one page at a time so each rerun only
+        # serializes a bounded slice to the browser
+        page_size = 1000
+        page_count = max(1, -(-len(filtered_contacts) // page_size))
+        page_number = 1
+        if page_count > 1:
+            page_number = st.number_input("Page", min_value=1, max_value=page_count, value=1)
+        page_start = (page_number - 1) * page_size
+        page_contacts = filtered_contacts.iloc[page_start:page_start + page_size]
         
-        # Show filtered contacts
         st.dataframe(
-            filtered_contacts[['id', 'name', 'phone', 'state']],
+            page_contacts[['id', 'name', 'phone', 'state']],
             use_container_width=True,
             height=400
         )
+        if page_count > 1:
+            st.caption(f"Showing {page_start + 1}-{page_start + len(page_contacts)} of {len(filtered_contacts)} contacts")
         
         # Export option
         if st.button("📤 Export Contacts"):
@@ -300,6 +350,10 @@ elif page == "📋 Contact Manager":
 elif page == "📞 Dialer Control":
     st.markdown('<h2 class="sub-header">🎯 Dialer Control Panel</h2>', unsafe_allow_html=True)
     
+    if st.session_state.dialer.store_error:
+        st.warning(f"⚠️ {st.session_state.dialer.store_error}")
+        st.session_state.dialer.store_error = None
+    
     if st.session_state.contacts.empty:
         st.warning("⚠️ No contacts loaded. Please import contacts first!")
         st.stop()
@@ -363,7 +417,7 @@ elif page == "📞 Dialer Control":
         
         with col_status1:
             if st.session_state.dialer.is_dialing and st.session_state.dialer.dialing_mode == "single":
-                st.markdown(f"### 🔄 {st.session_state.dialer.current_call['status'].upper()}")
+                st.markdown(f"### 🔄 {st.session_state.dialer.current_call.status.upper()}")
                 
                 if current_contact:
                     st.markdown(f"**Contact:** {current_contact.get('name', 'Unknown')}")
@@ -374,19 +428,19 @@ elif page == "📞 Dialer Control":
                     with st.chat_message("assistant"):
                         st.write(f"*Pre-dial announcement:* Calling **{current_contact.get('name', 'Unknown')}** from **{current_contact.get('state', 'N/A')}**...")
             
-            elif st.session_state.dialer.current_call and st.session_state.dialer.current_call['answered']:
+            elif st.session_state.dialer.current_call and st.session_state.dialer.current_call.answered:
                 st.markdown("### ✅ CALL ANSWERED")
                 st.markdown("### 📱 Screen Pop Active")
                 
                 # Screen Pop Simulation
-                contact = st.session_state.dialer.current_call['contact']
+                contact = st.session_state.dialer.current_call.contact
                 col_info1, col_info2 = st.columns(2)
                 with col_info1:
                     st.info(f"**Name:** {contact.get('name', 'Unknown')}")
                     st.info(f"**Phone:** {contact['phone']}")
                 with col_info2:
                     st.info(f"**State:** {contact.get('state', 'N/A')}")
-                    st.info(f"**Call Duration:** {st.session_state.dialer.current_call.get('duration', 0):.1f}s")
+                    st.info(f"**Call Duration:** {st.session_state.dialer.current_call.duration:.1f}s")
             
             elif current_contact:
                 st.markdown("### ⏳ READY TO DIAL (Single Mode)")
@@ -429,8 +483,8 @@ elif page == "📞 Dialer Control":
                     for call in active_calls:
                         with st.container():
                             st.markdown(f'<div class="power-call-card">', unsafe_allow_html=True)
-                            st.write(f"**{call['contact'].get('name', 'Unknown')}**")
-                            st.write(f"{call['contact']['phone']} • {call['contact'].get('state', 'N/A')}")
+                            st.write(f"**{call.contact.get('name', 'Unknown')}**")
+                            st.write(f"{call.contact['phone']} • {call.contact.get('state', 'N/A')}")
                             st.write(f"Status: 🔄 Dialing...")
                             st.markdown('</div>', unsafe_allow_html=True)
                 else:
@@ -440,11 +494,11 @@ elif page == "📞 Dialer Control":
                 st.markdown("#### ✅ Completed Calls")
                 if completed_calls:
                     for call in completed_calls[:5]:  # Show last 5
-                        status_icon = "✅" if call['answered'] else "❌"
+                        status_icon = "✅" if call.answered else "❌"
                         with st.container():
                             st.markdown(f'<div class="single-call-card">', unsafe_allow_html=True)
-                            st.write(f"{status_icon} **{call['contact'].get('name', 'Unknown')}**")
-                            st.write(f"{call['contact']['phone']} • {call.get('duration', 0):.1f}s")
+                            st.write(f"{status_icon} **{call.contact.get('name', 'Unknown')}**")
+                            st.write(f"{call.contact['phone']} • {call.duration:.1f}s")
                             st.markdown('</div>', unsafe_allow_html=True)
                 else:
                     st.info("No completed calls yet")
@@ -478,7 +532,7 @@ elif page == "📞 Dialer Control":
         if st.session_state.dialing_mode == "single":
             if st.button("🔄 Redial", use_container_width=True, 
                         disabled=not (st.session_state.dialer.current_call and 
-                                     st.session_state.dialer.current_call['status'] == 'failed')):
+                                     st.session_state.dialer.current_call.status == 'failed')):
                 if current_contact:
                     st.session_state.dialer.start_dialing(current_contact, max_redials, "single")
                     st.rerun()
@@ -516,10 +570,11 @@ elif page == "📞 Dialer Control":
     if st.session_state.campaign_active:
         st.warning(f"⚠️ Campaign is running in {st.session_state.dialing_mode.upper()} mode")
         
+        # Rerun once a second from the browser instead of sleeping in the script thread
+        st_autorefresh(interval=1000, key='campaign_tick')
+        
         # Auto-dialing logic based on mode
         if not st.session_state.dialer.is_dialing:
-            time.sleep(1)  # Simulate delay
-            
             if st.session_state.dialing_mode == "single":
                 # Single mode auto-dialing
                 if st.session_state.current_index < len(st.session_state.contacts):
@@ -534,8 +589,6 @@ elif page == "📞 Dialer Control":
                         if st.session_state.current_index >= len(st.session_state.contacts):
                             st.session_state.campaign_active = False
                             st.success("✅ Campaign completed all contacts!")
-                    
-                    st.rerun()
             else:  # Power mode auto-dialing
                 if st.session_state.current_index < len(st.session_state.contacts):
                     # Get next batch of 10
@@ -556,8 +609,6 @@ elif page == "📞 Dialer Control":
                         if st.session_state.current_index >= len(st.session_state.contacts):
                             st.session_state.campaign_active = False
                             st.success("✅ Campaign completed all contacts!")
-                    
-                    st.rerun()
     else:
         if st.button("Start Auto Campaign", type="secondary", use_container_width=True):
             st.session_state.campaign_active = True
@@ -593,6 +644,14 @@ elif page == "📊 Admin Dashboard":
                     st.success(f"Agent {new_agent_id} added!")
                     st.rerun()
     
+    # Agent aggregates, computed once per render
+    agents = st.session_state.agents.values()
+    sub_counts = Counter(a['subscription'] for a in agents)
+    active_agents = sum(1 for a in agents if a['active'])
+    total_calls = sum(a['calls_today'] for a in agents)
+    monthly_revenue = sub_counts['monthly'] * 29.99
+    annual_revenue = sub_counts['annual'] * 299.99
+    
     # Display agents
     col1, col2 = st.columns([3, 1])
     
@@ -613,9 +672,7 @@ elif page == "📊 Admin Dashboard":
     with col2:
         st.markdown("**Agent Stats**")
         st.metric("Total Agents", len(st.session_state.agents))
-        active_agents = sum(1 for a in st.session_state.agents.values() if a['active'])
         st.metric("Active Now", active_agents)
-        total_calls = sum(a['calls_today'] for a in st.session_state.agents.values())
         st.metric("Total Calls", total_calls)
     
     # Billing Overview
@@ -624,14 +681,13 @@ elif page == "📊 Admin Dashboard":
     col_b1, col_b2, col_b3 = st.columns(3)
     
     with col_b1:
-        st.metric("Monthly Revenue", f"${len([a for a in st.session_state.agents.values() if a['subscription'] == 'monthly']) * 29.99:.2f}")
+        st.metric("Monthly Revenue", f"${monthly_revenue:.2f}")
     
     with col_b2:
-        st.metric("Annual Revenue", f"${len([a for a in st.session_state.agents.values() if a['subscription'] == 'annual']) * 299.99:.2f}")
+        st.metric("Annual Revenue", f"${annual_revenue:.2f}")
     
     with col_b3:
-        total_rev = (len([a for a in st.session_state.agents.values() if a['subscription'] == 'monthly']) * 29.99 +
-                    len([a for a in st.session_state.agents.values() if a['subscription'] == 'annual']) * 299.99)
+        total_rev = monthly_revenue + annual_revenue
         st.metric("Total Revenue", f"${total_rev:.2f}")
     
     # Activity Log
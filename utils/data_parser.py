@@ -1,7 +1,20 @@
+import numpy as np
 import pandas as pd
 import streamlit as st
 from io import BytesIO
 import re
+from functools import lru_cache
+
+# Prefer the Rust-backed calamine reader for .xlsx, falling back to pure-Python openpyxl
+try:
+    import python_calamine  # noqa: F401
+    _XL_ENGINE = 'calamine'
+except ImportError:
+    _XL_ENGINE = 'openpyxl'
+
+# All regex objects in this module are compiled once at import and shared
+_NON_DIGIT_RE = re.compile(r'\D+')
+_DIGIT_RE = re.compile(r'\d')
 
 class LeadParser:
     """Flexible CSV/Excel parser for multiple lead source formats"""
@@ -18,104 +31,164 @@ class LeadParser:
     STATE_VARIANTS = ['state', 'State', 'STATE', 'st', 'St', 'State Code', 
                       'state_code', 'location', 'Location', 'region', 'Region']
     
+    # Variants normalized the same way as column names, plus one precompiled
+    # alternation per field for substring matches
+    _PHONE_KEYS = frozenset(v.lower().replace(' ', '_').replace('-', '_') for v in PHONE_VARIANTS)
+    _NAME_KEYS = frozenset(v.lower().replace(' ', '_').replace('-', '_') for v in NAME_VARIANTS)
+    _STATE_KEYS = frozenset(v.lower().replace(' ', '_').replace('-', '_') for v in STATE_VARIANTS)
+    _PHONE_RE = re.compile('|'.join(re.escape(v) for v in _PHONE_KEYS))
+    _NAME_RE = re.compile('|'.join(re.escape(v) for v in _NAME_KEYS))
+    _STATE_RE = re.compile('|'.join(re.escape(v) for v in _STATE_KEYS))
+    
+    @staticmethod
+    def clean_phone_series(phones):
+        """Clean and validate a whole column of phone numbers in one vectorized pass"""
+        # Strip non-numeric characters across the column at once
+        digits = phones.astype('string').str.replace(_NON_DIGIT_RE, '', regex=True)
+        lengths = digits.str.len().fillna(0)
+        
+        # Handle US numbers (add +1 if missing), otherwise just prefix +
+        cleaned = ('+' + digits).mask(lengths.eq(10), '+1' + digits)
+        return cleaned.where(lengths.gt(0))
+    
     @staticmethod
     def clean_phone_number(phone):
-        """Clean and validate phone numbers"""
+        """Clean and validate a single phone number"""
         if pd.isna(phone):
             return None
         
-        # Convert to string and remove non-numeric
-        phone_str = str(phone)
-        digits = re.sub(r'\D', '', phone_str)
-        
-        # Handle US numbers (add +1 if missing)
-        if len(digits) == 10:
-            return f"+1{digits}"
-        elif len(digits) == 11 and digits.startswith('1'):
-            return f"+{digits}"
-        elif digits.startswith('+'):
-            return digits
-        else:
-            return f"+{digits}" if digits else None
+        cleaned = LeadParser.clean_phone_series(pd.Series([phone], dtype=object)).iloc[0]
+        return None if pd.isna(cleaned) else cleaned
+    
+    @staticmethod
+    def looks_like_phone_column(values, sample_size=20):
+        """Check whether most sampled values carry at least 10 digits"""
+        digit_counts = values.head(sample_size).astype('string').str.count(_DIGIT_RE)
+        has_phone = digit_counts.fillna(0).ge(10)
+        return len(has_phone) > 0 and has_phone.mean() > 0.8
     
     @staticmethod
     def detect_column_mapping(df):
         """Auto-detect column mappings based on common variants"""
+        # Copy so callers can adjust the mapping without touching the cache
+        return dict(LeadParser._map_columns(tuple(df.columns)))
+    
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def _map_columns(columns):
+        """Detect column mappings for a tuple of column names (cached)"""
         mapping = {'phone': None, 'name': None, 'state': None}
+        ranks = {'phone': 0, 'name': 0, 'state': 0}
+        fields = (
+            ('phone', LeadParser._PHONE_KEYS, LeadParser._PHONE_RE),
+            ('name', LeadParser._NAME_KEYS, LeadParser._NAME_RE),
+            ('state', LeadParser._STATE_KEYS, LeadParser._STATE_RE),
+        )
         
-        for col in df.columns:
+        for col in columns:
             col_lower = str(col).lower().replace(' ', '_').replace('-', '_')
+            tokens = col_lower.split('_')
             
-            # Check phone variants
-            for variant in LeadParser.PHONE_VARIANTS:
-                if variant.lower() in col_lower:
-                    mapping['phone'] = col
-                    break
-            
-            # Check name variants
-            for variant in LeadParser.NAME_VARIANTS:
-                if variant.lower() in col_lower:
-                    mapping['name'] = col
-                    break
+            # Variants like 'st' and 'contact' also hit 'First Name' or 'Contact ID',
+            # so an exact name beats a whole-word match, which beats a substring
+            for field, keys, pattern in fields:
+                if col_lower in keys:
+                    rank = 3
+                elif not keys.isdisjoint(tokens):
+                    rank = 2
+                elif pattern.search(col_lower):
+                    rank = 1
+                else:
+                    continue
+                if rank > ranks[field]:
+                    ranks[field] = rank
+                    mapping[field] = col
             
-            # Check state variants
-            for variant in LeadParser.STATE_VARIANTS:
-                if variant.lower() in col_lower:
-                    mapping['state'] = col
-                    break
+            # Nothing can beat an exact match, so stop scanning wide sheets once every field has one
+            if min(ranks.values()) == 3:
+                break
         
         return mapping
     
     @staticmethod
-    def parse_uploaded_file(uploaded_file):
+    def read_uploaded_file(uploaded_file):
+        """Read uploaded CSV or Excel file as-is (None if the format is unsupported)"""
+        suffix = uploaded_file.name.rsplit('.', 1)[-1].lower()
+        return LeadParser._read_bytes(uploaded_file.getvalue(), suffix)
+    
+    @staticmethod
+    def parse_uploaded_file(uploaded_file, keep_original=False):
         """Parse uploaded CSV or Excel file with flexible mapping"""
+        # Streamlit reruns the whole script on every interaction, so key the
+        # parse on the file contents and only do the work once per upload
+        suffix = uploaded_file.name.rsplit('.', 1)[-1].lower()
+        return LeadParser._parse_bytes(uploaded_file.getvalue(), suffix, keep_original)
+    
+    @staticmethod
+    def _read_bytes(data, suffix):
+        """Read raw CSV or Excel bytes based on file type"""
+        if suffix == 'csv':
+            try:
+                # Multithreaded Arrow parser with Arrow-backed string columns
+                return pd.read_csv(BytesIO(data), engine='pyarrow', dtype_backend='pyarrow')
+            except (ImportError, ValueError):
+                # pyarrow missing or too old for this pandas
+                return pd.read_csv(BytesIO(data))
+        elif suffix == 'xlsx':
+            return pd.read_excel(BytesIO(data), engine=_XL_ENGINE)
+        elif suffix == 'xls':
+            # Legacy .xls goes through pandas' default xlrd reader
+            return pd.read_excel(BytesIO(data))
+        return None
+    
+    @staticmethod
+    @st.cache_data(show_spinner=False, max_entries=8)
+    def _parse_bytes(data, suffix, keep_original=False):
+        """Parse raw CSV or Excel bytes into the standardized contact format"""
         try:
             # Read file based on type
-            if uploaded_file.name.endswith('.csv'):
-                df = pd.read_csv(uploaded_file)
-            elif uploaded_file.name.endswith(('.xls', '.xlsx')):
-                df = pd.read_excel(uploaded_file, engine='openpyxl')
-            else:
+            df = LeadParser._read_bytes(data, suffix)
+            if df is None:
                 return None, "Unsupported file format"
             
             # Auto-detect column mapping
             mapping = LeadParser.detect_column_mapping(df)
             
-            # Create standardized dataframe
-            result_df = pd.DataFrame()
-            
-            # Map phone column
-            if mapping['phone']:
-                result_df['phone'] = df[mapping['phone']].apply(LeadParser.clean_phone_number)
-            else:
-                # Try to find any column that looks like phone numbers
+            # Fall back to any column that looks like phone numbers
+            if not mapping['phone']:
                 for col in df.columns:
-                    sample_val = str(df[col].iloc[0]) if len(df) > 0 else ''
-                    if any(char.isdigit() for char in sample_val) and len(str(sample_val)) >= 10:
-                        result_df['phone'] = df[col].apply(LeadParser.clean_phone_number)
+                    if LeadParser.looks_like_phone_column(df[col]):
                         mapping['phone'] = col
                         break
+                else:
+                    return None, "No phone number column found"
             
-            # Map name column
-            if mapping['name']:
-                result_df['name'] = df[mapping['name']].fillna('Unknown')
-            else:
-                result_df['name'] = 'Unknown'
+            # Clean phones first so invalid rows are dropped before building other columns
+            phones = LeadParser.clean_phone_series(df[mapping['phone']])
+            valid = phones.notna()
+            src = df.loc[valid]
             
-            # Map state column
+            # Map name and state columns, defaulting when missing. Arrow-backed columns
+            # can be all-null or numeric, so cast to strings before filling the gaps
+            names = src[mapping['name']].astype('string').fillna('Unknown') if mapping['name'] else 'Unknown'
             if mapping['state']:
-                result_df['state'] = df[mapping['state']].fillna('N/A')
+                states = src[mapping['state']].astype('string').fillna('N/A')
             else:
-                result_df['state'] = 'N/A'
+                states = pd.Series('N/A', index=src.index)
+            
+            # Only a few dozen distinct states, so store them as categories
+            columns = {'phone': phones[valid], 'name': names, 'state': states.astype('category')}
             
-            # Keep original data for reference
-            result_df['original_data'] = df.apply(lambda row: row.to_dict(), axis=1)
+            # Keep each contact's position in the source sheet for reference, so the full
+            # row is one read_uploaded_file(...).iloc[row] away instead of a dict per row
+            if keep_original:
+                columns['original_row'] = np.flatnonzero(valid.to_numpy()).astype(np.int32)
             
             # Add unique ID
-            result_df['id'] = range(1, len(result_df) + 1)
+            columns['id'] = range(1, len(src) + 1)
             
-            # Filter out invalid phone numbers
-            result_df = result_df[result_df['phone'].notna()]
+            # Create standardized dataframe in one allocation
+            result_df = pd.DataFrame(columns)
             
             return result_df, mapping
             
@@ -1,26 +1,100 @@
 import time
 import random
+import sqlite3
+import bisect
+from dataclasses import dataclass, field
+from functools import lru_cache
 from datetime import datetime
-import streamlit as st
+import numpy as np
+
+# Simulated call outcomes and their cumulative weights (30% answer rate for demo)
+_OUTCOMES = ('answered', 'no_answer', 'busy', 'failed')
+_CUM_WEIGHTS = (0.3, 0.7, 0.9, 1.0)
+_CUM_WEIGHTS_NP = np.array(_CUM_WEIGHTS)
+
+# Bound once so each dial attempt skips the module attribute lookup
+_rand = random.random
+_now = datetime.now
+_mono = time.monotonic
+
+@lru_cache(maxsize=None)
+def _redial_status(attempt, total):
+    """Status label for a redial, built once per (attempt, total) pair"""
+    return f'redialing ({attempt}/{total})'
+
+# Numba is optional and only worth its import and compile cost for very large
+# power batches (load tests); smaller batches stay on numpy searchsorted
+_NUMBA_MIN_BATCH = 1000
+_jit_sampler = None  # Compiled sampler once loaded, False if Numba isn't installed
+
+def _sample_outcomes(n):
+    """Draw n outcome indices by inverse-CDF sampling"""
+    out = np.empty(n, np.int8)
+    for i in range(n):
+        r = np.random.random()
+        j = 0
+        while r >= _CUM_WEIGHTS[j]:
+            j += 1
+        out[i] = j
+    return out
+
+def _get_jit_sampler():
+    """Import Numba and compile _sample_outcomes on first use (None if unavailable)"""
+    global _jit_sampler
+    if _jit_sampler is None:
+        try:
+            from numba import njit
+        except ImportError:
+            _jit_sampler = False
+        else:
+            sampler = njit(cache=True)(_sample_outcomes)
+            sampler(1)  # Compile (or load from the on-disk cache) now
+            _jit_sampler = sampler
+    return _jit_sampler or None
+
+@dataclass(slots=True)
+class CallRecord:
+    """A single call from first dial to completion, kept compact for long histories"""
+    contact: dict
+    start_time: datetime
+    start_mono: float  # Durations come from the monotonic clock
+    status: str
+    answered: bool = False
+    mode: str = 'single'
+    attempts: list = field(default_factory=list)
+    end_time: datetime | None = None
+    duration: float = 0.0
+    call_id: str = ''
 
 class DialerSimulator:
     """Simulates auto-dialer functionality with Single and Power modes"""
     
-    def __init__(self):
+    def __init__(self, store=None):
+        self.store = store  # Optional CampaignStore for persisting completed calls
+        self.store_error = None  # Last failed save, for the UI to report
         self.current_call = None
-        self.active_calls = []  # For power mode: stores multiple simultaneous calls
+        self._dialing_calls = []  # Power mode: calls from the current batch still ringing
+        self._finished_calls = []  # Power mode: answered/failed calls from the current batch
+        self._clear_after = None  # Monotonic deadline for clearing a completed batch
         self.call_history = []
         self.is_dialing = False
         self.redial_count = 0
         self.max_redials = 2  # Default: triple dial (1 initial + 2 redials)
         self.dialing_mode = "single"  # "single" or "power"
         self.power_batch_size = 10  # Number of simultaneous calls in power mode
+        self._rng = np.random.default_rng()  # Vectorized outcome draws for power batches
+        self._answered_count = 0  # Running totals so get_call_stats doesn't rescan history
+        self._total_duration = 0.0
+        self._stats_cache = (None, None)  # (history length, stats dict)
     
     def set_dialing_mode(self, mode="single"):
         """Set dialing mode: 'single' or 'power'"""
         self.dialing_mode = mode
         if mode == "power":
-            self.active_calls = []  # Reset active calls
+            # Reset the current batch
+            self._dialing_calls = []
+            self._finished_calls = []
+            self._clear_after = None
     
     def start_dialing(self, contact, max_redials=2, mode="single"):
         """Start dialing a contact - supports both single and power modes"""
@@ -36,14 +110,7 @@ class DialerSimulator:
         """Start single contact dialing"""
         self.redial_count = 0
         self.is_dialing = True
-        self.current_call = {
-            'contact': contact,
-            'start_time': datetime.now(),
-            'status': 'dialing',
-            'attempts': [],
-            'answered': False,
-            'mode': 'single'
-        }
+        self.current_call = CallRecord(contact, _now(), _mono(), 'dialing')
         self._make_single_dial_attempt()
     
     def _start_power_dialing(self, contacts):
@@ -53,25 +120,58 @@ class DialerSimulator:
         
         self.is_dialing = True
         
-        # Clear previous active calls
-        self.active_calls = []
-        
-        # Create call objects for each contact (max 10)
-        for i, contact in enumerate(contacts[:self.power_batch_size]):
-            call = {
-                'contact': contact,
-                'start_time': datetime.now(),
-                'status': 'dialing',
-                'attempts': [],
-                'answered': False,
-                'call_id': f"power_{i}",
-                'mode': 'power'
-            }
-            self.active_calls.append(call)
+        # Clear the previous batch
+        self._dialing_calls = []
+        self._finished_calls = []
+        self._clear_after = None
+        
+        # Draw every outcome in one pass, before the clock starts so loading
+        # the compiled sampler never shows up as call time
+        n = min(len(contacts), self.power_batch_size)
+        sampler = _get_jit_sampler() if n >= _NUMBA_MIN_BATCH else None
+        if sampler is not None:
+            outcome_idx = sampler(n)
+        else:
+            outcome_idx = np.searchsorted(_CUM_WEIGHTS_NP, self._rng.random(n), side='right')
+        
+        # Batch calls are simultaneous, so they share one start timestamp
+        start_time = _now()
+        start_mono = _mono()
+        
+        # Create call objects for each contact (max 10), sized up front
+        batch = [None] * n
+        for i in range(n):
+            batch[i] = CallRecord(contacts[i], start_time, start_mono, 'dialing',
+                                  mode='power', call_id=f"power_{i}")
         
         # Start all calls simultaneously
-        for call in self.active_calls:
-            self._make_power_dial_attempt(call)
+        end_time = _now()
+        duration = _mono() - start_mono
+        for call, idx in zip(batch, outcome_idx.tolist()):
+            outcome = _OUTCOMES[idx]
+            call.attempts.append({
+                'time': start_time,
+                'number': call.contact['phone'],
+                'result': outcome
+            })
+            
+            # Update call status (no redials in power mode)
+            if outcome == 'answered':
+                call.status = 'answered'
+                call.answered = True
+            else:
+                call.status = 'failed'
+            
+            # Log immediately for power mode; every outcome finishes the call
+            self._finished_calls.append(call)
+            call.end_time = end_time
+            call.duration = duration
+            self.call_history.append(call)
+            self._answered_count += call.answered
+            self._total_duration += duration
+        
+        # Persist the whole batch in one transaction
+        self._save_calls(batch)
     
     def _make_single_dial_attempt(self):
         """Simulate a single dial attempt"""
@@ -79,110 +179,99 @@ class DialerSimulator:
             return
         
         attempt = {
-            'time': datetime.now(),
-            'number': self.current_call['contact']['phone'],
+            'time': _now(),
+            'number': self.current_call.contact['phone'],
             'result': None
         }
         
         # Simulate call outcome (random for demo)
-        outcomes = ['answered', 'no_answer', 'busy', 'failed']
-        weights = [0.3, 0.4, 0.2, 0.1]  # 30% answer rate for demo
-        
-        outcome = random.choices(outcomes, weights=weights)[0]
+        outcome = _OUTCOMES[bisect.bisect(_CUM_WEIGHTS, _rand())]
         attempt['result'] = outcome
         
-        self.current_call['attempts'].append(attempt)
+        self.current_call.attempts.append(attempt)
         
         if outcome == 'answered':
-            self.current_call['status'] = 'answered'
-            self.current_call['answered'] = True
+            self.current_call.status = 'answered'
+            self.current_call.answered = True
             self.is_dialing = False
             self._log_call(self.current_call)
         elif self.redial_count < self.max_redials:
-            self.current_call['status'] = f'redialing ({self.redial_count + 1}/{self.max_redials})'
+            self.current_call.status = _redial_status(self.redial_count + 1, self.max_redials)
             self.redial_count += 1
         else:
-            self.current_call['status'] = 'failed'
+            self.current_call.status = 'failed'
             self.is_dialing = False
             self._log_call(self.current_call)
     
-    def _make_power_dial_attempt(self, call):
-        """Simulate a power dial attempt (no redials)"""
-        if not call:
-            return
-        
-        attempt = {
-            'time': datetime.now(),
-            'number': call['contact']['phone'],
-            'result': None
-        }
-        
-        # Simulate call outcome (random for demo)
-        outcomes = ['answered', 'no_answer', 'busy', 'failed']
-        weights = [0.3, 0.4, 0.2, 0.1]  # 30% answer rate for demo
-        
-        outcome = random.choices(outcomes, weights=weights)[0]
-        attempt['result'] = outcome
-        call['attempts'].append(attempt)
-        
-        # Update call status
-        if outcome == 'answered':
-            call['status'] = 'answered'
-            call['answered'] = True
-        else:
-            call['status'] = 'failed'
-        
-        # Log immediately for power mode (no redials)
-        call['end_time'] = datetime.now()
-        call['duration'] = (call['end_time'] - call['start_time']).total_seconds()
-        self.call_history.append(call.copy())
-    
     def update_power_calls_status(self):
         """Update status of all active power calls"""
         if self.dialing_mode != "power":
             return
         
-        # Check if all power calls are completed
-        active_calls = [call for call in self.active_calls if call['status'] == 'dialing']
+        # Clear a completed batch once its display delay has passed
+        if self._clear_after is not None and _mono() >= self._clear_after:
+            self._finished_calls = []
+            self._clear_after = None
         
-        if len(active_calls) == 0:
+        # Check if all power calls are completed
+        if not self._dialing_calls:
             self.is_dialing = False
-            # Clear active calls after a delay
-            time.sleep(1)
-            self.active_calls = []
+            # Keep finished calls visible for a second without blocking the script
+            if self._finished_calls and self._clear_after is None:
+                self._clear_after = _mono() + 1.0
     
     def get_active_power_calls(self):
         """Get currently active power calls"""
-        return [call for call in self.active_calls if call['status'] == 'dialing']
+        return self._dialing_calls
     
     def get_completed_power_calls(self):
         """Get completed power calls from current batch"""
-        return [call for call in self.active_calls if call['status'] in ['answered', 'failed']]
+        return self._finished_calls
     
     def _log_call(self, call):
         """Log completed call to history"""
-        call_record = call.copy()
-        call_record['end_time'] = datetime.now()
-        if 'duration' not in call_record:
-            call_record['duration'] = (call_record['end_time'] - call_record['start_time']).total_seconds()
-        self.call_history.append(call_record)
+        # The call is finished once logged, so record it in place rather than copying
+        call.end_time = _now()
+        if not call.duration:
+            call.duration = _mono() - call.start_mono
+        self.call_history.append(call)
+        self._answered_count += call.answered
+        self._total_duration += call.duration
+        self._save_calls([call])
+    
+    def _save_calls(self, calls):
+        """Persist finished calls; a database failure is recorded rather than failing the dial"""
+        if not self.store:
+            return
+        try:
+            self.store.save_calls(calls)
+        except sqlite3.Error as e:
+            self.store_error = f"Call history could not be saved: {e}"
     
     def get_call_stats(self):
         """Get call statistics"""
         total_calls = len(self.call_history)
-        answered_calls = len([c for c in self.call_history if c['answered']])
+        # History only grows, so an unchanged length means unchanged stats
+        if self._stats_cache[0] == total_calls:
+            return self._stats_cache[1]
+        
+        answered_calls = self._answered_count
         success_rate = (answered_calls / total_calls * 100) if total_calls > 0 else 0
         
-        return {
+        stats = {
             'total_calls': total_calls,
             'answered_calls': answered_calls,
             'success_rate': success_rate,
-            'avg_duration': sum(c.get('duration', 0) for c in self.call_history) / total_calls if total_calls > 0 else 0
+            'avg_duration': self._total_duration / total_calls if total_calls > 0 else 0
         }
+        self._stats_cache = (total_calls, stats)
+        return stats
     
     def reset(self):
         """Reset dialer state"""
         self.current_call = None
-        self.active_calls = []
+        self._dialing_calls = []
+        self._finished_calls = []
+        self._clear_after = None
         self.is_dialing = False
         self.redial_count = 0 
\ No newline at end of file
@@ -0,0 +1,111 @@
+import os
+import uuid
+import sqlite3
+from contextlib import closing
+
+# Database lives next to the sample leads unless a path is given
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               'data', 'autodialer.db')
+
+# Every row carries the session that wrote it, so concurrent app sessions
+# sharing the database never overwrite each other's campaigns
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    session_id TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    name TEXT,
+    phone TEXT NOT NULL,
+    state TEXT,
+    PRIMARY KEY (session_id, id)
+);
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    contact_id INTEGER,
+    name TEXT,
+    phone TEXT,
+    state TEXT,
+    mode TEXT,
+    status TEXT,
+    answered INTEGER,
+    attempts INTEGER,
+    start_time TEXT,
+    end_time TEXT,
+    duration REAL
+);
+"""
+
+class CampaignStore:
+    """Write-only SQLite log of each session's contacts and calls, written in batched transactions"""
+    
+    # Nothing is read back into the app: each session gets a fresh random id and keeps
+    # its working state in st.session_state. Calls are only ever appended, so the
+    # database grows with every session and is pruned by whoever operates it
+    
+    def __init__(self, db_path=DEFAULT_DB_PATH, session_id=None):
+        self.db_path = db_path
+        self.session_id = session_id or uuid.uuid4().hex
+        with closing(self._connect()) as conn:
+            # WAL is stored in the database file, so it only needs setting once
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+    
+    def _connect(self):
+        """Open an autocommit connection; writes manage their own transactions"""
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+    
+    def _write_batch(self, statements):
+        """Run (sql, rows) pairs inside a single BEGIN/COMMIT transaction"""
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN')
+            try:
+                for sql, rows in statements:
+                    conn.executemany(sql, rows)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+    
+    def save_contacts(self, contacts_df):
+        """Replace this session's stored contact list with the given campaign contacts"""
+        rows = (
+            (self.session_id, int(contact_id), name, phone, state)
+            for contact_id, name, phone, state in
+            contacts_df[['id', 'name', 'phone', 'state']].itertuples(index=False, name=None)
+        )
+        self._write_batch([
+            ('DELETE FROM contacts WHERE session_id = ?', [(self.session_id,)]),
+            ('INSERT OR REPLACE INTO contacts (session_id, id, name, phone, state) VALUES (?, ?, ?, ?, ?)', rows),
+        ])
+    
+    def save_calls(self, calls):
+        """Append completed calls to the call history"""
+        rows = [(self.session_id,) + CampaignStore._call_row(call) for call in calls]
+        if rows:
+            self._write_batch([(
+                'INSERT INTO calls (session_id, contact_id, name, phone, state, mode, status, answered, '
+                'attempts, start_time, end_time, duration) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                rows,
+            )])
+    
+    @staticmethod
+    def _call_row(call):
+        """Flatten a call record into a row for the calls table"""
+        contact = call.contact
+        contact_id = contact.get('id')
+        end_time = call.end_time
+        return (
+            int(contact_id) if contact_id is not None else None,
+            contact.get('name'),
+            contact['phone'],
+            contact.get('state'),
+            call.mode,
+            call.status,
+            int(call.answered),
+            len(call.attempts),
+            call.start_time.isoformat(),
+            end_time.isoformat() if end_time else None,
+            call.duration,
+        )